@@ -1,8 +1,9 @@
 import pandas as pd
 import numpy as np
+from joblib import parallel_backend, cpu_count
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 import config
+from io_utils import read_df, write_report_csv
 
 # --------------------------------------------------------------------------
 # 1. PREPARE DATA FOR ML
@@ -11,43 +12,42 @@ def prepare_features(df):
     """
     Selects and transforms columns to be understandable by a Machine Learning model.
     ML models only understand numbers, so we must encode text (One-Hot Encoding).
+    
+    No standardization: IsolationForest is invariant to per-feature affine/linear
+    scaling (split points are drawn uniformly between each feature's min and max).
+    
+    Works in place: NaN amounts are filled with 0 and 'discrepancy_ratio' is added
+    to df. Returns the float32 feature matrix only.
     """
     print("--- 4.1 ML Prep: Feature Engineering ---")
     
-    # We work on a copy to avoid messing up the original data
-    df_ml = df.copy()
-    
     # Fill NaNs (Missing values crash ML models)
-    df_ml["amount_diff"] = df_ml["amount_diff"].fillna(0)
-    df_ml["amount_eur"] = df_ml["amount_eur"].fillna(0)
+    # Done in place: no full copy of the transaction table is needed.
+    df["amount_diff"] = df["amount_diff"].fillna(0)
+    df["amount_eur"] = df["amount_eur"].fillna(0)
     
     # Feature 1: The Discrepancy Ratio (How big is the error relative to the amount?)
     # If error is 10€ on 100€ transaction -> 10% (Huge!)
     # If error is 10€ on 1M€ transaction -> 0.001% (Noise)
     # We add 0.01 to avoid division by zero.
-    df_ml["discrepancy_ratio"] = df_ml["amount_diff"] / (df_ml["amount_eur"] + 0.01)
+    amt_eur = df["amount_eur"].to_numpy(np.float32, copy=False)
+    amt_diff = df["amount_diff"].to_numpy(np.float32, copy=False)
+    ratio = amt_diff / (amt_eur + np.float32(0.01))
+    df["discrepancy_ratio"] = ratio
     
     # Feature 2: Encoding Currency (Text -> Numbers)
-    # We use One-Hot Encoding: currency_USD becomes a column [0, 1]
-    df_encoded = pd.get_dummies(df_ml, columns=["currency_A"], prefix="curr")
-    
-    # Select features for the model
-    # We want the model to look at: Amount, The Error (diff), and the Currency.
-    features = ["amount_eur", "amount_diff", "discrepancy_ratio"]
-    
-    # Add the dynamic currency columns (curr_USD, curr_GBP...)
-    currency_cols = [c for c in df_encoded.columns if c.startswith("curr_")]
-    features += currency_cols
+    # One-Hot Encoding built straight from the category codes: one column per
+    # currency in config.CURRENCIES.
+    # Unknown/missing currencies (code -1) get an all-zero row.
+    cats = pd.Categorical(df["currency_A"], categories=config.CURRENCIES)
+    onehot = np.vstack([np.eye(len(config.CURRENCIES), dtype=np.float32),
+                        np.zeros((1, len(config.CURRENCIES)), dtype=np.float32)])[cats.codes]
     
     # Final dataset for training
-    X = df_encoded[features]
-    
-    # Standardize data (Put all features on same scale)
-    # Important because 'amount' (10,000) is huge compared to 'discrepancy_ratio' (0.01)
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    # We want the model to look at: Amount, The Error (diff), and the Currency.
+    X = np.column_stack([amt_eur, amt_diff, ratio, onehot])
     
-    return X_scaled, df_ml
+    return X
 
 # --------------------------------------------------------------------------
 # 2. TRAIN MODEL (UNSUPERVISED)
@@ -59,29 +59,36 @@ def detect_anomalies(df_enriched):
     print("\n🤖 STARTING AI ANOMALY DETECTION (Isolation Forest) 🤖")
     
     # 1. Prepare Data
-    X, df_labeled = prepare_features(df_enriched)
+    # Feature columns and predictions are added directly to df_enriched.
+    X = prepare_features(df_enriched)
     
     # 2. Train Model
     # contamination=0.05 means we estimate about 5% of data is anomalous.
-    model = IsolationForest(n_estimators=100, contamination=0.05, random_state=config.RANDOM_SEED)
-    model.fit(X)
-    
-    # 3. Predict
-    # -1 means Anomaly, 1 means Normal
-    df_labeled["anomaly_prediction"] = model.predict(X)
-    
-    # 4. Get Anomaly Score (Lower is more abnormal)
-    df_labeled["anomaly_score"] = model.decision_function(X)
-    
-    # 5. Clean Output (Map -1 to "ANOMALY")
-    df_labeled["is_anomaly_ml"] = df_labeled["anomaly_prediction"].apply(lambda x: "YES" if x == -1 else "NO")
+    # 50 trees of 256 samples each: at ~5k rows the anomaly scores are already
+    # stable with 50 trees, and half the trees means half the fit/scoring cost.
+    # (capped at the row count, like max_samples="auto", for very small datasets)
+    # n_jobs=-1 spreads the trees over all cores; the threading backend keeps
+    # the feature matrix shared instead of copying it into worker processes.
+    model = IsolationForest(n_estimators=50, max_samples=min(256, len(X)), contamination=0.05, n_jobs=-1, random_state=config.RANDOM_SEED)
+    with parallel_backend("threading", n_jobs=cpu_count()):
+        model.fit(X)
+        
+        # 3. Get Anomaly Score (Lower is more abnormal)
+        # predict() would walk the whole forest a second time, so we score once.
+        scores = model.decision_function(X)
+    df_enriched["anomaly_score"] = scores
+    
+    # 4. Predict & Clean Output
+    # Same rule as model.predict: a negative score means Anomaly ("YES").
+    is_anomaly = scores < 0
+    df_enriched["is_anomaly_ml"] = np.where(is_anomaly, "YES", "NO")
     
     # Count results
-    anomaly_count = df_labeled[df_labeled["is_anomaly_ml"] == "YES"].shape[0]
+    anomaly_count = int(is_anomaly.sum())
     print(f"-> Model Analysis Complete.")
-    print(f"-> Detected {anomaly_count} anomalies out of {df_labeled.shape[0]} transactions.")
+    print(f"-> Detected {anomaly_count} anomalies out of {df_enriched.shape[0]} transactions.")
     
-    return df_labeled
+    return df_enriched
 
 # --------------------------------------------------------------------------
 # 3. MAIN EXECUTION
@@ -90,7 +97,7 @@ if __name__ == "__main__":
     # 1. Load Data (From Phase 3)
     print("Loading enriched data...")
     try:
-        df_fx = pd.read_csv(config.PROCESSED_DATA_DIR / "transactions_enriched.csv")
+        df_fx = read_df(config.PROCESSED_DATA_DIR / "transactions_enriched.parquet")
     except FileNotFoundError:
         print(" Error: File not found. Run Phase 3 first.")
         exit()
@@ -100,7 +107,7 @@ if __name__ == "__main__":
     
     # 3. Save Final Dataset (This is the one for Power BI!)
     output_path = config.PROCESSED_DATA_DIR / "final_transactions_with_anomalies.csv"
-    df_final.to_csv(output_path, index=False)
+    write_report_csv(df_final, output_path)
     print(f" Final dataset saved to {output_path}")
     
     # 4. Show Top Anomalies
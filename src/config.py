@@ -33,12 +33,44 @@ CURRENCIES = ["EUR", "USD", "GBP", "CHF"]
 # If difference < 0.01, we consider it a match.
 AMOUNT_TOLERANCE = 0.01 
 
+# Every possible outcome of the reconciliation engine (fixed category order)
+RECON_STATUSES = ["MATCH", "MISSING_IN_A", "MISSING_IN_B", "AMOUNT_MISMATCH", "STATUS_MISMATCH"]
+
+# Engine for the reconciliation join + classification: "pandas" (default) or
+# "polars" (multi-threaded join and expression engine, needs Polars installed).
+RECON_ENGINE = os.environ.get("RECON_ENGINE", "pandas")
+
+# Number of hash shards for the reconciliation (env RECON_SHARDS). 0 or 1 joins the
+# statements in one go; N > 1 joins them shard by shard (see reconcile_sharded).
+RECON_SHARDS = int(os.environ.get("RECON_SHARDS", "0"))
+
 # --------------------------------------------------------------------------
 # 4. OUTPUT FILE PATHS
 # --------------------------------------------------------------------------
-FILE_PROVIDER_A = RAW_DATA_DIR / "transactions_provider_A.csv"
-FILE_PROVIDER_B = RAW_DATA_DIR / "transactions_provider_B.csv"
-FILE_MARKET_RATES = RAW_DATA_DIR / "fx_rates_market.csv"
+FILE_PROVIDER_A = RAW_DATA_DIR / "transactions_provider_A.parquet"
+FILE_PROVIDER_B = RAW_DATA_DIR / "transactions_provider_B.parquet"
+FILE_MARKET_RATES = RAW_DATA_DIR / "fx_rates_market.parquet"
+
+# main.py passes DataFrames between phases in memory. Set to True to also save
+# the intermediate datasets (reconciliation output, enriched transactions),
+# e.g. to re-run a single phase script on its own.
+SAVE_INTERMEDIATES = False
 
 # Random seed for reproducibility
-RANDOM_SEED = 42
\ No newline at end of file
+RANDOM_SEED = 42
+
+# --------------------------------------------------------------------------
+# 5. GPU ACCELERATION (OPTIONAL)
+# --------------------------------------------------------------------------
+# Set USE_GPU=1 (or run main.py with --gpu) to run the Monte Carlo draws on
+# the GPU through CuPy. Ignored if CuPy is not installed.
+USE_GPU = os.environ.get("USE_GPU") == "1"
+
+# Below this many simulated values (currencies x simulations) the host<->GPU
+# transfer costs more than it saves, so the CPU path is used anyway.
+GPU_MIN_SIMULATIONS = 1_000_000
+
+# Monte Carlo scenarios per currency for the VaR (env MC_SIMULATIONS).
+# The default (1000 x 3 currencies) stays on the CPU; e.g. MC_SIMULATIONS=1000000
+# is large enough for the GPU path.
+MC_SIMULATIONS = int(os.environ.get("MC_SIMULATIONS", "1000"))
\ No newline at end of file
@@ -1,11 +1,11 @@
 import pandas as pd
 import numpy as np
 from faker import Faker
-import random
 from datetime import timedelta, date
 
 # Import config variables to ensure consistency across the project
 import config
+from io_utils import write_df
 
 # --------------------------------------------------------------------------
 # 0. SETUP & INITIALIZATION
@@ -17,8 +17,10 @@ fake = Faker()
 # This ensures that every time we run the script, we get the EXACT same "random" data.
 # Crucial for debugging and sharing the project.
 Faker.seed(config.RANDOM_SEED)
-np.random.seed(config.RANDOM_SEED)
-random.seed(config.RANDOM_SEED)
+np.random.seed(config.RANDOM_SEED) # Global NumPy state (still used by the Monte Carlo engine)
+
+# Dedicated NumPy Generator (PCG64) for all the synthetic data draws below.
+rng = np.random.default_rng(config.RANDOM_SEED)
 
 # --------------------------------------------------------------------------
 # 1. MARKET DATA GENERATION (FX RATES)
@@ -40,27 +42,24 @@ def generate_market_rates():
         "EURCHF": 0.95
     }
     
-    market_data = []
+    pairs = list(base_rates.keys())
+    start_rates = np.array(list(base_rates.values()))
     
-    for pair, start_rate in base_rates.items():
-        # Simulate daily returns using a normal distribution (Gaussian)
-        # loc=0 (no drift), scale=0.002 (daily volatility ~0.2%)
-        returns = np.random.normal(loc=0, scale=0.002, size=len(dates))
-        
-        # Calculate the price path: Price_t = Price_0 * exp(sum(returns))
-        price_path = start_rate * np.exp(np.cumsum(returns))
-        
-        # Store data row by row
-        for d, rate in zip(dates, price_path):
-            market_data.append({
-                "date": d.date(),
-                "currency_pair": pair,
-                "market_rate": round(rate, 4)
-            })
-            
-    # Convert to DataFrame and Save
-    df_market = pd.DataFrame(market_data)
-    df_market.to_csv(config.FILE_MARKET_RATES, index=False)
+    # Simulate daily returns using a normal distribution (Gaussian)
+    # One row per currency pair, one column per day.
+    # loc=0 (no drift), scale=0.002 (daily volatility ~0.2%)
+    returns = rng.normal(loc=0, scale=0.002, size=(len(pairs), len(dates)))
+    
+    # Calculate the price paths: Price_t = Price_0 * exp(sum(returns))
+    price_paths = start_rates[:, None] * np.exp(np.cumsum(returns, axis=1))
+    
+    # Convert to DataFrame (long format: pair by pair, day by day) and Save
+    df_market = pd.DataFrame({
+        "date": np.tile(dates.values, len(pairs)),
+        "currency_pair": np.repeat(pairs, len(dates)),
+        "market_rate": np.round(price_paths.ravel(), 4)
+    })
+    write_df(df_market, config.FILE_MARKET_RATES)
     print(f" Market rates saved to: {config.FILE_MARKET_RATES}")
     return df_market
 
@@ -74,34 +73,32 @@ def generate_provider_A():
     """
     print("--- 2. Generating Provider A (Internal System) ---")
     
-    data = []
     dates = pd.date_range(start=config.START_DATE, end=config.END_DATE)
+    n = config.NUM_TRANSACTIONS
     
-    for _ in range(config.NUM_TRANSACTIONS):
-        # 2.1 Random Selection of basic attributes
-        txn_date = random.choice(dates).date()
-        currency = random.choice(config.CURRENCIES)
-        
-        # Skip EUR because we want to focus on Cross-Border FX transactions
-        if currency == "EUR": continue 
-        
-        # 2.2 Generate Financial Details
-        amount = round(random.uniform(100, 10000), 2) # Amount between 100 and 10k
-        txn_id = fake.uuid4()                         # Unique ID (e.g., 3e4r-5t6y...)
-        
-        # 2.3 Append to list
-        data.append({
-            "transaction_id": txn_id,
-            "date": txn_date,
-            "currency": currency,
-            "amount": amount,
-            "status": "COMPLETED",
-            "source": "Internal_System"
-        })
+    # 2.1 Random Selection of basic attributes (all rows drawn at once)
+    txn_dates = rng.choice(dates.values, size=n)
+    currencies = rng.choice(config.CURRENCIES, size=n)
+    
+    # 2.2 Generate Financial Details
+    amounts = np.round(rng.uniform(100, 10000, size=n), 2) # Amount between 100 and 10k
+    
+    # Skip EUR because we want to focus on Cross-Border FX transactions
+    keep = currencies != "EUR"
+    
+    # 2.3 Build the table in one go
+    data = {
+        "transaction_id": [fake.uuid4() for _ in range(keep.sum())], # Unique ID (e.g., 3e4r-5t6y...)
+        "date": txn_dates[keep],
+        "currency": currencies[keep],
+        "amount": amounts[keep],
+        "status": "COMPLETED",
+        "source": "Internal_System"
+    }
         
     # Convert to DataFrame and Save
     df_a = pd.DataFrame(data)
-    df_a.to_csv(config.FILE_PROVIDER_A, index=False)
+    write_df(df_a, config.FILE_PROVIDER_A)
     print(f" Provider A data saved ({len(df_a)} rows) to: {config.FILE_PROVIDER_A}")
     return df_a
 
@@ -121,27 +118,28 @@ def generate_provider_B_with_errors(df_a):
     
     # 3.2 INJECT ERROR: Missing Transactions (Cash missing or Timing issue)
     # Scenario: The bank hasn't processed these payments yet, or data was lost.
-    # Logic: Randomly select 2% of indices and drop them.
-    drop_indices = np.random.choice(df_b.index, size=int(len(df_b) * 0.02), replace=False)
-    df_b = df_b.drop(drop_indices)
+    # Logic: Randomly select 2% of rows and drop them.
+    # Rows are picked by position (0..n-1), so the draws never depend on the index labels.
+    drop_positions = rng.choice(len(df_b), size=int(len(df_b) * 0.02), replace=False)
+    df_b = df_b.drop(df_b.index[drop_positions])
+    amount_col = df_b.columns.get_loc("amount")
+    status_col = df_b.columns.get_loc("status")
     
     # 3.3 INJECT ERROR: Amount Mismatch (Hidden Fees / FX Slippage)
     # Scenario: We sent 1000, Bank says 990 (Fees deducted).
     # Logic: Select 1% of transactions and reduce amount by 0.5% to 2%.
-    mismatch_indices = np.random.choice(df_b.index, size=int(len(df_b) * 0.01), replace=False)
-    for idx in mismatch_indices:
-        original_amount = df_b.loc[idx, "amount"]
-        fee_factor = random.uniform(0.98, 0.995) # 0.5% to 2% fee
-        df_b.loc[idx, "amount"] = round(original_amount * fee_factor, 2)
+    mismatch_positions = rng.choice(len(df_b), size=int(len(df_b) * 0.01), replace=False)
+    fee_factors = rng.uniform(0.98, 0.995, size=len(mismatch_positions)) # 0.5% to 2% fee
+    df_b.iloc[mismatch_positions, amount_col] = np.round(df_b.iloc[mismatch_positions, amount_col].to_numpy() * fee_factors, 2)
         
     # 3.4 INJECT ERROR: Status Mismatch
     # Scenario: System says 'Completed', Bank says 'Pending'.
     # Logic: Select 3% of transactions and change status.
-    status_indices = np.random.choice(df_b.index, size=int(len(df_b) * 0.03), replace=False)
-    df_b.loc[status_indices, "status"] = "PENDING"
+    status_positions = rng.choice(len(df_b), size=int(len(df_b) * 0.03), replace=False)
+    df_b.iloc[status_positions, status_col] = "PENDING"
     
     # Save
-    df_b.to_csv(config.FILE_PROVIDER_B, index=False)
+    write_df(df_b, config.FILE_PROVIDER_B)
     print(f" Provider B data saved ({len(df_b)} rows) with injected errors.")
     return df_b
 
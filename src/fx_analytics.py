@@ -1,6 +1,13 @@
 import pandas as pd
 import numpy as np
 import config
+from io_utils import read_df, write_df
+
+# Optional GPU backend for the Monte Carlo engine (see config.USE_GPU)
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
 
 # --------------------------------------------------------------------------
 # 1. PREPARATION & ENRICHMENT (Mark-to-Market)
@@ -11,41 +18,55 @@ def apply_market_rates(df_transactions, df_rates):
     
     Logic:
     1. Create a common key (e.g., 'EURUSD') to join tables.
-    2. Merge transactions with rates based on Date + Currency Pair.
+    2. Look up the rate for each transaction based on Date + Currency Pair.
     3. Convert amounts to EUR (Base Currency).
+    
+    The rate columns are added to df_transactions, which is returned.
     """
     print("--- 3.1 FX Analysis: Applying Market Rates ---")
     
     # 1. Prepare Join Keys
     # We assume Base Currency is EUR. So key is "EUR" + "USD" = "EURUSD".
-    df_transactions["join_key"] = "EUR" + df_transactions["currency_A"]
+    # Renaming the categories only touches the few distinct labels, not every row.
+    # The key is only needed for the lookup, so it is not stored in the output.
+    join_key = df_transactions["currency_A"].astype("category").cat.rename_categories(lambda c: "EUR" + c)
     
     # Ensure dates are datetime objects for merging
     df_transactions["date_A"] = pd.to_datetime(df_transactions["date_A"])
     df_rates["date"] = pd.to_datetime(df_rates["date"])
     
-    # 2. Merge (Left Join)
-    df_enriched = pd.merge(
-        df_transactions,
-        df_rates,
-        left_on=["date_A", "join_key"],
-        right_on=["date", "currency_pair"],
-        how="left"
+    # 2. Rate Lookup (Left Join semantics)
+    # The rates table is tiny (pairs x days), so instead of a full merge we index it
+    # by (date, pair) and reindex with the transaction keys: one aligned column,
+    # NaN where no rate exists, and no copy of the transaction table.
+    # Only the three columns used by the lookup are read from df_rates.
+    rate_lookup = pd.Series(
+        df_rates["market_rate"].to_numpy(np.float64),
+        index=pd.MultiIndex.from_arrays([df_rates["date"], df_rates["currency_pair"]])
     )
+    keys = pd.MultiIndex.from_arrays([df_transactions["date_A"], join_key])
+    df_enriched = df_transactions
+    df_enriched["market_rate"] = rate_lookup.reindex(keys).to_numpy()
     
     # 3. Calculate EUR Equivalent (Mark-to-Market)
     # Rate is usually quoted as 1 EUR = X USD (e.g., 1.10).
     # So: Amount EUR = Amount USD / Rate.
-    df_enriched["amount_eur"] = df_enriched["amount_A"] / df_enriched["market_rate"]
+    # The reciprocal is computed once and reused by both conversions (multiply, not divide).
+    # Conversions run in float64: amounts stored as float32 are widened and rounded
+    # back to their cents first, so the EUR values carry no float32 error.
+    inv_rate = 1.0 / df_enriched["market_rate"].to_numpy()
+    amount_a = np.round(df_enriched["amount_A"].to_numpy(np.float64), 2)
+    df_enriched["amount_eur"] = amount_a * inv_rate
     
     # 4. Calculate Financial Impact of Discrepancies
     # We convert the loss (amount_diff) into EUR.
-    df_enriched["pnl_impact_eur"] = df_enriched["amount_diff"] / df_enriched["market_rate"]
+    df_enriched["pnl_impact_eur"] = df_enriched["amount_diff"].to_numpy() * inv_rate
     
     # Handling cases where currency is EUR (Rate = 1)
-    mask_eur = df_transactions["currency_A"] == "EUR"
-    df_enriched.loc[mask_eur, "amount_eur"] = df_enriched.loc[mask_eur, "amount_A"]
-    df_enriched.loc[mask_eur, "pnl_impact_eur"] = df_enriched.loc[mask_eur, "amount_diff"]
+    # There is no EURxEUR rate, so those rows keep their original amounts.
+    is_eur = (df_enriched["currency_A"] == "EUR").to_numpy()
+    df_enriched["amount_eur"] = np.where(is_eur, amount_a, df_enriched["amount_eur"].to_numpy())
+    df_enriched["pnl_impact_eur"] = np.where(is_eur, df_enriched["amount_diff"].to_numpy(), df_enriched["pnl_impact_eur"].to_numpy())
 
     return df_enriched
 
@@ -59,6 +80,8 @@ def generate_fx_report(df):
     print("\n💰 FINANCIAL IMPACT REPORT 💰")
     
     # Total Volume processed in EUR
+    # The EUR columns are float64 computed from the amounts' exact cents (see
+    # apply_market_rates), so the totals carry no float32 error.
     total_volume_eur = df["amount_eur"].sum()
     print(f"Total Volume Processed: {total_volume_eur:,.2f} €")
     
@@ -72,60 +95,67 @@ def generate_fx_report(df):
 # --------------------------------------------------------------------------
 # 3. MONTE CARLO SIMULATION (RISK ENGINE)
 # --------------------------------------------------------------------------
-def calculate_var(df_enriched, confidence_level=0.95, simulations=1000, days=30):
+def calculate_var(df_enriched, confidence_level=0.95, simulations=None, days=30):
     """
     Simulates future FX moves using Geometric Brownian Motion to calculate Value at Risk (VaR).
     
     Logic:
     1. Calculate current Net Open Position (NOP) per currency.
-    2. Simulate 1000 paths for FX rates over 30 days.
+    2. Simulate terminal FX rates at the 30-day horizon (config.MC_SIMULATIONS
+       scenarios unless `simulations` is given).
     3. Re-evaluate the portfolio value in each scenario.
     4. The 5th percentile of the P&L distribution is the VaR (95%).
     """
     print("\n STARTING MONTE CARLO SIMULATION (Risk Engine) ")
+    if simulations is None:
+        simulations = config.MC_SIMULATIONS
     
     # 1. Get Net Open Position (Exposure) in EUR
     # We group by currency pair (e.g., EURUSD) to see how much we hold.
-    exposure = df_enriched.groupby("currency_A")["amount_eur"].sum()
+    exposure = df_enriched["amount_eur"].astype(np.float64).groupby(df_enriched["currency_A"], observed=True).sum()
     exposure = exposure.drop("EUR", errors="ignore") # Remove EUR, no FX risk
     
     print("Current Net Exposure by Currency (in EUR):")
     print(exposure.apply(lambda x: f"{x:,.2f} €"))
     
-    total_potential_loss = 0
-    
     # Simulation Parameters
     # We assume a daily volatility of 0.5% (typical for major pairs)
     daily_vol = 0.005 
-    dt = 1 # 1 day step
     
     print(f"\nSimulating {simulations} scenarios over {days} days...")
     
-    results = {}
-    
-    for currency, position_eur in exposure.items():
-        # Geometric Brownian Motion Formula:
-        # We simulate 1000 scenarios of returns over 30 days
-        random_shocks = np.random.normal(0, 1, (simulations, days))
-        
-        # Calculate price path evolution (Log returns)
-        log_returns = np.cumsum(( -0.5 * daily_vol**2 ) * dt + (daily_vol * np.sqrt(dt)) * random_shocks, axis=1)
-        
-        # Convert to price factor (e.g., 0.98 means -2% drop)
-        price_paths = np.exp(log_returns)
-        
-        # Get the final return at day 30 for each scenario
-        final_returns = price_paths[:, -1]
-        
-        # Calculate P&L: If we hold 1M and returns are 0.95, we lost 50k.
-        simulated_pnl = position_eur * (final_returns - 1)
-        
-        # Calculate VaR (5th percentile = worst 5% cases)
-        var_95 = np.percentile(simulated_pnl, (1 - confidence_level) * 100)
-        
-        print(f" -> Risk for {currency}: VaR 95% = {var_95:,.2f} €")
-        total_potential_loss += var_95
-        results[currency] = var_95
+    # Geometric Brownian Motion Formula:
+    # Only the price at day 30 is used, and the sum of 30 daily log returns
+    # N(-0.5*σ²*dt, σ√dt) is itself normal: N(-0.5*σ²*T, σ√T).
+    # So we draw the terminal log return directly, for all currencies at once.
+    # Large runs can do the draw + exp on the GPU (same maths, CuPy arrays).
+    use_gpu = config.USE_GPU and cp is not None and len(exposure) * simulations >= config.GPU_MIN_SIMULATIONS
+    xp = cp if use_gpu else np
+    if config.USE_GPU and not use_gpu:
+        reason = "CuPy is not installed" if cp is None else f"fewer than {config.GPU_MIN_SIMULATIONS:,} simulated values"
+        print(f"GPU requested but not used ({reason}): running on the CPU.")
+    if use_gpu:
+        # Seeded like the CPU path, so GPU runs are reproducible too
+        cp.random.seed(config.RANDOM_SEED)
+    
+    random_shocks = xp.random.standard_normal((len(exposure), simulations))
+    log_returns = -0.5 * daily_vol**2 * days + daily_vol * np.sqrt(days) * random_shocks
+    
+    # Convert to price factor (e.g., 0.98 means -2% drop)
+    final_returns = xp.exp(log_returns)
+    if use_gpu:
+        final_returns = cp.asnumpy(final_returns)
+    
+    # Calculate P&L: If we hold 1M and returns are 0.95, we lost 50k.
+    simulated_pnl = exposure.to_numpy()[:, None] * (final_returns - 1)
+    
+    # Calculate VaR (5th percentile = worst 5% cases), one per currency
+    var_95 = np.percentile(simulated_pnl, (1 - confidence_level) * 100, axis=1)
+    results = dict(zip(exposure.index, var_95))
+    
+    for currency, var_ccy in results.items():
+        print(f" -> Risk for {currency}: VaR 95% = {var_ccy:,.2f} €")
+    total_potential_loss = var_95.sum()
         
     print("-" * 30)
     print(f"📉 TOTAL PORTFOLIO VaR (95%): {total_potential_loss:,.2f} €")
@@ -140,8 +170,8 @@ if __name__ == "__main__":
     # 1. Load Data
     print("Loading reconciliation data...")
     try:
-        df_recon = pd.read_csv(config.PROCESSED_DATA_DIR / "reconciliation_output.csv")
-        df_rates = pd.read_csv(config.FILE_MARKET_RATES)
+        df_recon = read_df(config.PROCESSED_DATA_DIR / "reconciliation_output.parquet")
+        df_rates = read_df(config.FILE_MARKET_RATES)
     except FileNotFoundError:
         print(" Error: Files not found. Run Phase 2 first.")
         exit()
@@ -153,8 +183,8 @@ if __name__ == "__main__":
     loss = generate_fx_report(df_fx)
     
     # 4. Save Enriched Data
-    output_path = config.PROCESSED_DATA_DIR / "transactions_enriched.csv"
-    df_fx.to_csv(output_path, index=False)
+    output_path = config.PROCESSED_DATA_DIR / "transactions_enriched.parquet"
+    write_df(df_fx, output_path)
     print(f" Enriched data saved to {output_path}")
 
     # 5. Run Monte Carlo Simulation
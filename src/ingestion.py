@@ -1,9 +1,13 @@
 import pandas as pd
+import numpy as np
 import config
+from io_utils import read_df
 
 # --------------------------------------------------------------------------
 # 1. CLEANING FUNCTIONS
 # --------------------------------------------------------------------------
+ARROW_STRING = pd.StringDtype("pyarrow")
+
 def clean_dataframe(df: pd.DataFrame, source_name: str) -> pd.DataFrame:
     """
     Standardizes the format of the transaction datasets.
@@ -14,20 +18,37 @@ def clean_dataframe(df: pd.DataFrame, source_name: str) -> pd.DataFrame:
     # 1. Standardize Dates
     # Converts string "2024-01-12" to a real Datetime object.
     # 'coerce' means: if a date is unreadable, turn it into NaT (Not a Time) instead of crashing.
-    if "date" in df.columns:
+    # Parquet inputs already carry a datetime dtype, so they are left untouched.
+    if "date" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["date"]):
         df["date"] = pd.to_datetime(df["date"], errors="coerce")
 
     # 2. Standardize Amounts (The "Float" Problem)
     # In finance, strict rounding is key to avoid 100.000000001 mismatches.
+    # Rounded amounts are then stored as float32 (7 significant digits, plenty for
+    # cents on these amounts) to halve the memory every later phase reads.
+    # float32 is storage only: arithmetic on amounts (differences, FX conversion)
+    # widens them to float64 and rounds back to the cent first.
     if "amount" in df.columns:
-        df["amount"] = df["amount"].astype(float).round(2)
+        df["amount"] = df["amount"].astype(float).round(2).astype(np.float32)
 
     # 3. String Cleanup
     # Removes accidental spaces (e.g., " USD " -> "USD")
+    # Columns are held as Arrow-backed strings so .str.strip() runs in PyArrow's
+    # C++ string kernels; columns that already have that dtype are not converted.
     cols_to_strip = ["currency", "status", "transaction_id"]
     for col in cols_to_strip:
         if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
+            if df[col].dtype != ARROW_STRING:
+                df[col] = df[col].astype(ARROW_STRING)
+            df[col] = df[col].str.strip()
+
+    # 4. Low-Cardinality Labels -> Categorical
+    # A handful of distinct values (USD, GBP...) repeated thousands of times:
+    # stored as small integer codes + a lookup table instead of Python strings.
+    cols_to_categorize = ["currency", "status", "source"]
+    for col in cols_to_categorize:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
 
     return df
 
@@ -36,7 +57,7 @@ def clean_dataframe(df: pd.DataFrame, source_name: str) -> pd.DataFrame:
 # --------------------------------------------------------------------------
 def load_data():
     """
-    Loads raw CSV files from the data/raw directory.
+    Loads raw Parquet files from the data/raw directory.
     Applies cleaning and returns dictionary of DataFrames.
     """
     print("--- 1. Ingestion & Cleaning Started ---")
@@ -45,15 +66,15 @@ def load_data():
     if not config.FILE_PROVIDER_A.exists():
         raise FileNotFoundError(f"CRITICAL: {config.FILE_PROVIDER_A} not found. Run Phase 1 first.")
 
-    # Load Raw CSVs
+    # Load Raw Files
     print(f"Loading {config.FILE_PROVIDER_A}...")
-    df_a = pd.read_csv(config.FILE_PROVIDER_A)
+    df_a = read_df(config.FILE_PROVIDER_A)
     
     print(f"Loading {config.FILE_PROVIDER_B}...")
-    df_b = pd.read_csv(config.FILE_PROVIDER_B)
+    df_b = read_df(config.FILE_PROVIDER_B)
     
     print(f"Loading {config.FILE_MARKET_RATES}...")
-    df_rates = pd.read_csv(config.FILE_MARKET_RATES)
+    df_rates = read_df(config.FILE_MARKET_RATES)
 
     # Apply Cleaning Logic
     df_a_clean = clean_dataframe(df_a, "Provider A")
@@ -61,6 +82,7 @@ def load_data():
     
     # Specific cleaning for Market Rates (ensure date is datetime)
     df_rates["date"] = pd.to_datetime(df_rates["date"])
+    df_rates["currency_pair"] = df_rates["currency_pair"].astype("category")
 
     print("--- Ingestion Complete: Data is clean and typed. ---")
     
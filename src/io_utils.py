@@ -0,0 +1,44 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# --------------------------------------------------------------------------
+# 1. PARQUET STORAGE HELPERS
+# --------------------------------------------------------------------------
+# Intermediate datasets are stored as Parquet instead of CSV.
+# Parquet keeps the column types (dates stay dates, amounts stay floats),
+# so nothing has to be re-parsed from text when the next phase loads it.
+# Final reports consumed by Power BI are still exported as CSV.
+
+def read_df(path) -> pd.DataFrame:
+    """
+    Loads a DataFrame saved with write_df().
+    """
+    return pd.read_parquet(path.with_suffix(".parquet"), engine="pyarrow")
+
+def write_df(df: pd.DataFrame, path) -> None:
+    """
+    Saves a DataFrame as a zstd-compressed Parquet file (without the index).
+    """
+    df.to_parquet(path.with_suffix(".parquet"), engine="pyarrow", compression="zstd", index=False)
+
+# --------------------------------------------------------------------------
+# 2. CSV REPORT EXPORT
+# --------------------------------------------------------------------------
+def write_report_csv(df: pd.DataFrame, path) -> None:
+    """
+    Exports a final report as CSV (for Power BI).
+    Uses PyArrow's multi-threaded CSV writer (~10x faster than DataFrame.to_csv).
+    Floats are written with their shortest exact representation (5144.72, not
+    5144.720215 for float32 amounts).
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    
+    # Dates without a time part are written as plain dates (2024-01-08), as before
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            values = df[field.name].dropna()
+            if (values == values.dt.normalize()).all():
+                table = table.set_column(i, field.name, table.column(i).cast(pa.date32(), safe=False))
+    
+    pacsv.write_csv(table, path)
@@ -14,13 +14,18 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent / "src"))
 
 import config
+from io_utils import write_df, write_report_csv
 from data_generator import generate_market_rates, generate_provider_A, generate_provider_B_with_errors
 from ingestion import load_data
-from reconciliation import perform_reconciliation
+from reconciliation import perform_reconciliation, save_reconciliation
 from fx_analytics import apply_market_rates, generate_fx_report, calculate_var
 from anomaly_models import detect_anomalies
 
-def run_pipeline():
+def run_pipeline(use_gpu=False):
+    # Optional: run the Monte Carlo engine on the GPU (needs CuPy)
+    if use_gpu:
+        config.USE_GPU = True
+
     print("="*50)
     print("🚀 STARTING PAYMENTS OPS & RISK PIPELINE")
     print("="*50)
@@ -37,13 +42,16 @@ def run_pipeline():
 
     # --- STEP 3: RECONCILIATION ---
     print("\n[STEP 3] Running Reconciliation Engine...")
-    df_recon = perform_reconciliation(df_a_clean, df_b_clean)
-    # Save intermediate result
-    df_recon.to_csv(config.PROCESSED_DATA_DIR / "reconciliation_output.csv", index=False)
+    df_recon, _ = perform_reconciliation(df_a_clean, df_b_clean)
+    # Save intermediate result (optional, the next phase uses the in-memory frame)
+    if config.SAVE_INTERMEDIATES:
+        save_reconciliation(df_recon, df_a_clean, df_b_clean)
 
     # --- STEP 4: FINANCIAL ANALYTICS ---
     print("\n[STEP 4] Calculating FX P&L and Risk (VaR)...")
     df_enriched = apply_market_rates(df_recon, df_rates)
+    if config.SAVE_INTERMEDIATES:
+        write_df(df_enriched, config.PROCESSED_DATA_DIR / "transactions_enriched.parquet")
     generate_fx_report(df_enriched)
     calculate_var(df_enriched) # Prints VaR
 
@@ -53,7 +61,7 @@ def run_pipeline():
     
     # Final Export
     final_path = config.PROCESSED_DATA_DIR / "final_global_report.csv"
-    df_final.to_csv(final_path, index=False)
+    write_report_csv(df_final, final_path)
     
     print("\n" + "="*50)
     print(f" PIPELINE FINISHED SUCCESSFULY")
@@ -61,4 +69,4 @@ def run_pipeline():
     print("="*50)
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    run_pipeline(use_gpu="--gpu" in sys.argv)
\ No newline at end of file
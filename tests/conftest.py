@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The pipeline modules live flat in src/ and import each other by name (import config)
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
@@ -0,0 +1,21 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import anomaly_models
+
+def test_small_dataset_fits_without_max_samples_warning():
+    n = 40  # fewer rows than the 256 samples per tree
+    df = pd.DataFrame({
+        "amount_eur": np.linspace(100, 5000, n),
+        "amount_diff": np.r_[np.zeros(n - 1), 250.0],
+        "currency_A": ["USD", "GBP"] * (n // 2),
+    })
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        df_out = anomaly_models.detect_anomalies(df)
+
+    assert set(df_out["is_anomaly_ml"]) <= {"YES", "NO"}
+    assert len(df_out) == n
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import fx_analytics
+
+def exposure_frame():
+    return pd.DataFrame({
+        "currency_A": pd.Categorical(["USD", "GBP", "CHF", "USD"]),
+        "amount_eur": [1_000_000.0, 500_000.0, 250_000.0, 250_000.0],
+    })
+
+def test_gpu_var_is_reproducible_and_close_to_cpu(monkeypatch):
+    pytest.importorskip("cupy")
+    monkeypatch.setattr(config, "USE_GPU", True)
+    simulations = config.GPU_MIN_SIMULATIONS  # 3 currencies x this: above the GPU gate
+
+    var_gpu = fx_analytics.calculate_var(exposure_frame(), simulations=simulations)
+    assert fx_analytics.calculate_var(exposure_frame(), simulations=simulations) == var_gpu
+
+    monkeypatch.setattr(config, "USE_GPU", False)
+    var_cpu = fx_analytics.calculate_var(exposure_frame(), simulations=simulations)
+    assert var_gpu == pytest.approx(var_cpu, rel=0.01)
+
+def test_var_uses_configured_simulations(monkeypatch, capsys):
+    monkeypatch.setattr(config, "MC_SIMULATIONS", 2000)
+    var = fx_analytics.calculate_var(exposure_frame())
+
+    assert "Simulating 2000 scenarios" in capsys.readouterr().out
+    assert np.isfinite(var) and var < 0